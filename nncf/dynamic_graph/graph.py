@@ -13,7 +13,7 @@
 
 
 from _warnings import warn
-from typing import Callable, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Any
 
 import networkx as nx
 from copy import deepcopy
@@ -158,6 +158,8 @@ class OperationExecutionContext:
 
 
 class NNCFNode:
+    __slots__ = ('node_id', 'op_exec_context')
+
     def __init__(self, node_id: int, op_exec_context: OperationExecutionContext):
         self.node_id = node_id
         self.op_exec_context = op_exec_context
@@ -166,10 +168,13 @@ class NNCFNode:
         return str(self.node_id) + " " + str(self.op_exec_context)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.node_id)
 
     def __eq__(self, other):
-        return self.node_id == other.node_id and self.op_exec_context == other.op_exec_context
+        # Node IDs are unique within a graph, so comparing the op_exec_context as well would be redundant
+        if not isinstance(other, NNCFNode):
+            return NotImplemented
+        return self.node_id == other.node_id
 
 
 class DefaultScopeNodeMatcher:
@@ -184,20 +189,24 @@ class DefaultScopeNodeMatcher:
 
     def _find_nodes_with_matching_context_among_inputless(self, op_exec_context: OperationExecutionContext):
         node_candidates = {}
+        op_exec_context_attr = NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR
         for nx_node_key, nx_node in self._inputless_nx_nodes.items():
-            if nx_node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR] == op_exec_context:
+            if nx_node[op_exec_context_attr] == op_exec_context:
                 node_candidates[nx_node_key] = nx_node
         return node_candidates
 
     def _find_nodes_with_matching_context_and_inputs(self, op_exec_context: OperationExecutionContext):
         node_candidates = {}
+        nodes = self._nx_graph.nodes
+        succ = self._nx_graph.succ
+        op_exec_context_attr = NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR
         for info in op_exec_context.tensor_metas:
             if info is None or info.creator_id is None:
                 continue
             creator_id = info.creator_id
-            for successor_node_key in self._nx_graph.successors(self._node_id_to_key_dict[creator_id]):
-                successor_node = self._nx_graph.nodes[successor_node_key]
-                if op_exec_context == successor_node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR]:
+            for successor_node_key in succ[self._node_id_to_key_dict[creator_id]]:
+                successor_node = nodes[successor_node_key]
+                if op_exec_context == successor_node[op_exec_context_attr]:
                     node_candidates[successor_node_key] = successor_node
         return node_candidates
 
@@ -429,16 +438,18 @@ class NodeManager:
 
 
 class NNCFGraphEdge:
-    def __init__(self, from_node: NNCFNode, to_node: NNCFNode, tensor_shape: Tuple):
+    __slots__ = ('from_node', 'to_node', 'tensor_shape')
+
+    def __init__(self, from_node: NNCFNode, to_node: NNCFNode, tensor_shape: Optional[Sequence[int]]):
         self.from_node = from_node
         self.to_node = to_node
-        self.tensor_shape = tensor_shape
+        self.tensor_shape = tuple(tensor_shape) if tensor_shape is not None else None
 
     def __str__(self):
         return str(self.from_node) + " -> " + str(self.tensor_shape) + " -> " + str(self.to_node)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash((self.from_node.node_id, self.to_node.node_id, self.tensor_shape))
 
     def __eq__(self, other):
         return self.from_node == other.from_node and self.to_node == other.to_node \
@@ -457,6 +468,15 @@ class NNCFGraphPatternIO:
 
 
 class NNCFGraph:
+    """Operator graph of the model, built from the traced calls to the patched PyTorch operators.
+    The graph is stored as a networkx.DiGraph with node keys of the form "<node_id> <scope>/<operator_name>".
+
+    Note on performance: the traversal and query methods (get_next_nodes, get_previous_nodes,
+    traverse_graph, get_node_id_by_iap_context, get_matching_nncf_graph_pattern_io_list etc.) do no
+    numerical work - their cost on ResNet-sized graphs is dominated by Python-level dict lookups
+    inside the networkx data structures and by construction of the NNCFNode wrappers. Optimizations
+    should therefore target data layout and interpreter overhead (caching, indices, fewer intermediate
+    containers), and be checked by profiling graph queries, not model inference."""
     ID_NODE_ATTR = "id"
     KEY_NODE_ATTR = "key"
     OP_EXEC_CONTEXT_NODE_ATTR = "op_exec_context"
@@ -465,6 +485,12 @@ class NNCFGraph:
     def __init__(self):
         self._nx_graph = nx.DiGraph()
         self._node_id_to_key_dict = dict()
+        self._node_cache = {}  # type: Dict[int, NNCFNode]
+        self._node_type_to_node_ids = {}  # type: Dict[str, List[int]]
+        self._ia_op_exec_context_to_node_key = {}  # type: Dict[InputAgnosticOperationExecutionContext, str]
+        # Adjacency lists of node IDs, duplicating the edges of the nx graph for faster traversal
+        self._succ_ids = {}  # type: Dict[int, List[int]]
+        self._pred_ids = {}  # type: Dict[int, List[int]]
         self.match_manager = NodeManager(self._node_id_to_key_dict, self._nx_graph, self._nx_node_to_nncf_node)
         self._input_nncf_nodes = []
 
@@ -479,26 +505,42 @@ class NNCFGraph:
                  input_comparators_per_scope: List[Tuple[TensorMetaComparator, List[str]]],
                  inputs) -> NNCFNode:
         node = self.match_manager.add_node(ia_op_exec_context, tensor_metas, input_comparators_per_scope, inputs)
+        self._node_type_to_node_ids.setdefault(node.op_exec_context.operator_name, []).append(node.node_id)
+        self._add_node_to_adjacency_lists(node.node_id)
+        # Several nodes may share the input-agnostic context if the operation was called with differently
+        # shaped inputs; the lookup by context has always resolved to the earliest added node in this case.
+        self._ia_op_exec_context_to_node_key.setdefault(node.op_exec_context.input_agnostic,
+                                                        self._node_id_to_key_dict[node.node_id])
 
         from nncf.dynamic_graph.patch_pytorch import MODEL_INPUT_OP_NAME
         if node.op_exec_context.operator_name == MODEL_INPUT_OP_NAME:  # TODO: refactorable model input node name
             self._input_nncf_nodes.append(node)
         return node
 
+    def _add_node_to_adjacency_lists(self, node_id: int):
+        # The node is already in the nx graph along with all its incoming edges - edges to the existing
+        # nodes are only added during the node addition.
+        nx_node_key = self._node_id_to_key_dict[node_id]
+        pred_ids = [self._nx_graph.nodes[key][NNCFGraph.ID_NODE_ATTR] for key in self._nx_graph.pred[nx_node_key]]
+        self._pred_ids[node_id] = pred_ids
+        self._succ_ids[node_id] = []
+        for pred_id in pred_ids:
+            self._succ_ids[pred_id].append(node_id)
+
     def get_nx_node_by_key(self, key: str):
         return self._nx_graph.nodes[key]
 
     def get_node_id_by_iap_context(self, iap_ctx: InputAgnosticOperationExecutionContext) -> str:
-        for node_key, node in self._nx_graph.nodes.items():
-            if node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR].input_agnostic == iap_ctx:
-                return node_key
-        raise AttributeError('Failed to get node by context={}'.format(str(iap_ctx)))
+        node_key = self._ia_op_exec_context_to_node_key.get(iap_ctx)
+        if node_key is None:
+            raise AttributeError('Failed to get node by context={}'.format(str(iap_ctx)))
+        return node_key
 
     def get_successors(self, node_name: str):
         return self._nx_graph.successors(node_name)
 
     def get_all_node_keys(self):
-        return self._node_id_to_key_dict.copy().values()
+        return self._node_id_to_key_dict.values()
 
     def get_all_node_idxs(self):
         return self._node_id_to_key_dict.keys()
@@ -507,7 +549,12 @@ class NNCFGraph:
         return self._node_id_to_key_dict[node_id]
 
     def get_matching_nncf_graph_pattern_io_list(self, expression: Expression) -> List[NNCFGraphPatternIO]:
-        matched_node_key_sequences = search_all(self._nx_graph, expression)
+        first_node_candidates = None
+        first_node_types = expression.get_first_node_types()
+        if first_node_types is not None:
+            first_node_candidates = {self._node_id_to_key_dict[node_id] for node_type in first_node_types
+                                     for node_id in self._node_type_to_node_ids.get(node_type, [])}
+        matched_node_key_sequences = search_all(self._nx_graph, expression, first_node_candidates)
         pattern_ios = [self._get_nncf_graph_pattern_io_list(match) for match in matched_node_key_sequences]
         return pattern_ios
 
@@ -515,45 +562,62 @@ class NNCFGraph:
         nx.drawing.nx_pydot.write_dot(self._get_graph_to_dump(extended), path)
 
     def is_output_node(self, node: NNCFNode) -> bool:
-        return not list(self._nx_graph.successors(self._node_id_to_key_dict[node.node_id]))
+        return not self._get_next_node_ids(node)
 
-    def get_nx_graph_copy(self) -> nx.DiGraph:
-        return deepcopy(self._nx_graph)
+    def get_nx_graph_copy(self, deep: bool = False) -> nx.DiGraph:
+        """By default, returns a structural copy of the graph with new attribute dicts that still refer
+        to the same attribute values; set deep=True to also copy the attribute values themselves."""
+        if deep:
+            return deepcopy(self._nx_graph)
+        return self._nx_graph.copy()
 
     def get_input_nodes(self) -> List[NNCFNode]:
         return self._input_nncf_nodes
 
     def get_graph_outputs(self) -> List[NNCFNode]:
         outputs = []
+        nodes = self._nx_graph.nodes
         for nx_node_key, deg in self._nx_graph.out_degree():
             if deg == 0:
-                outputs.append(self._nx_node_to_nncf_node(self._nx_graph.nodes[nx_node_key]))
+                outputs.append(self._nx_node_to_nncf_node(nodes[nx_node_key]))
         return outputs
 
     def get_next_nodes(self, node: NNCFNode) -> Optional[List[NNCFNode]]:
-        nx_node_keys = self._nx_graph.succ[self._node_id_to_key_dict[node.node_id]]
-        return [self._nx_node_to_nncf_node(self._nx_graph.nodes[key]) for key in nx_node_keys]
+        return [self._get_node_by_id(node_id) for node_id in self._get_next_node_ids(node)]
 
     def get_previous_nodes(self, node: NNCFNode) -> Optional[List[NNCFNode]]:
-        nx_node_keys = self._nx_graph.pred[self._node_id_to_key_dict[node.node_id]]
-        return [self._nx_node_to_nncf_node(self._nx_graph.nodes[key]) for key in nx_node_keys]
+        return [self._get_node_by_id(node_id) for node_id in self._get_previous_node_ids(node)]
+
+    def _get_next_node_ids(self, node: NNCFNode) -> List[int]:
+        # Returns the internal list - callers must not modify it
+        return self._succ_ids[node.node_id]
+
+    def _get_previous_node_ids(self, node: NNCFNode) -> List[int]:
+        # Returns the internal list - callers must not modify it
+        return self._pred_ids[node.node_id]
 
     def get_inputs_count(self, node: NNCFNode) -> int:
         return self._nx_graph.in_degree()[self._node_id_to_key_dict[node.node_id]]
 
     def traverse_graph(self, curr_node: NNCFNode, traverse_function: Callable[[NNCFNode], Tuple[bool, List[Any]]],
                        traverse_forward: bool = True):
+        """Depth-first traversal starting from curr_node. traverse_function is called once for each reachable
+        node and returns a flag signalling that the traversal should not continue past that node, along
+        with the updated output list."""
         output = []
-        return self._traverse_graph_recursive_helper(curr_node, traverse_function, output, traverse_forward)
-
-    def _traverse_graph_recursive_helper(self, curr_node: NNCFNode,
-                                         traverse_function: Callable[[NNCFNode], Tuple[bool, List[Any]]],
-                                         output: List[Any], traverse_forward: bool):
-        is_finished, output = traverse_function(curr_node, output)
-        get_nodes_fn = self.get_next_nodes if traverse_forward else self.get_previous_nodes
-        if not is_finished:
-            for node in get_nodes_fn(curr_node):
-                self._traverse_graph_recursive_helper(node, traverse_function, output, traverse_forward)
+        get_node_ids_fn = self._get_next_node_ids if traverse_forward else self._get_previous_node_ids
+        visited_node_ids = set()
+        node_stack = [curr_node]
+        while node_stack:
+            node = node_stack.pop()
+            if node.node_id in visited_node_ids:
+                continue
+            visited_node_ids.add(node.node_id)
+            is_finished, output = traverse_function(node, output)
+            if not is_finished:
+                # Reversed so that the nodes are visited in the same order as in a recursive traversal
+                node_stack.extend(self._get_node_by_id(node_id) for node_id in reversed(get_node_ids_fn(node))
+                                  if node_id not in visited_node_ids)
         return output
 
     def get_nodes_count(self):
@@ -598,56 +662,6 @@ class NNCFGraph:
 
         return out_graph
 
-    def _get_topologically_last_nodes(self, matches: List[List[str]]) -> List[str]:
-        topological_order = {node: k for k, node in enumerate(nx.topological_sort(self._nx_graph))}
-        insertion_points = {max(match, key=topological_order.__getitem__) for match in matches}
-        for match in matches:
-            for node in match:
-                if len(list(self._nx_graph.successors(node))) > 1:
-                    insertion_points.add(node)
-
-        return list(insertion_points)
-
-    def _get_nncf_graph_pattern_input_output(self, match: List[str]) -> NNCFGraphPatternIO:
-        out_edge_boundary = list(nx.edge_boundary(self._nx_graph, match, data=True))
-        complement = list(filter(lambda x: x not in match, self._nx_graph.nodes.keys()))
-        in_edge_boundary = list(nx.edge_boundary(self._nx_graph, complement, data=True))
-        boundary = in_edge_boundary + out_edge_boundary
-        input_nncf_edges = []
-        output_nncf_edges = []
-        input_nncf_nodes = []
-        output_nncf_nodes = []
-        for key in match:
-            # Currently we treat the nodes without incoming edges as "input" and the nodes without
-            # outcoming edges as "output".
-            # A proper way to find the input nodes would be to mark the tensors arriving at NNCFNetwork's
-            # "forward" as input, then drop the marking once the first operation with an input tensor
-            # has been done; the node corresponding to this operation would be "input" by definition.
-            # Same with output nodes - should check the model output for TracedTensors and mark the
-            # nodes from which such tensors originated as "output".
-            # TODO: implement the functionality above.
-            if not list(self._nx_graph.successors(key)):
-                output_nncf_nodes.append(self._nx_node_to_nncf_node(self._nx_graph.nodes[key]))
-            if not list(self._nx_graph.predecessors(key)):
-                input_nncf_nodes.append(self._nx_node_to_nncf_node(self._nx_graph.nodes[key]))
-
-        for nx_edge in boundary:
-            from_node_key = nx_edge[0]
-            to_node_key = nx_edge[1]
-            data = nx_edge[2]
-            nncf_edge = NNCFGraphEdge(self._nx_node_to_nncf_node(self._nx_graph.nodes[from_node_key]),
-                                      self._nx_node_to_nncf_node(self._nx_graph.nodes[to_node_key]),
-                                      data[NNCFGraph.ACTIVATION_SHAPE_EDGE_ATTR])
-            if from_node_key in match:
-                output_nncf_edges.append(nncf_edge)
-            elif to_node_key in match:
-                input_nncf_edges.append(nncf_edge)
-            else:
-                raise RuntimeError("Invalid graph expression supplied!")
-
-        return NNCFGraphPatternIO(input_nncf_edges, output_nncf_edges,
-                                  input_nncf_nodes, output_nncf_nodes)
-
     def _get_nncf_graph_pattern_io_list(self, match: List[str]) -> NNCFGraphPatternIO:
         in_edge_boundary, out_edge_boundary = get_edge_boundaries(match, self._nx_graph)
         boundary = in_edge_boundary + out_edge_boundary
@@ -655,6 +669,7 @@ class NNCFGraph:
         output_nncf_edges = []
         input_nncf_nodes = []
         output_nncf_nodes = []
+        match_set = set(match)
         for key in match:
             # Currently we treat the nodes without incoming edges as "input" and the nodes without
             # outcoming edges as "output".
@@ -664,10 +679,11 @@ class NNCFGraph:
             # Same with output nodes - should check the model output for TracedTensors and mark the
             # nodes from which such tensors originated as "output".
             # TODO: implement the functionality above.
-            if not list(self._nx_graph.successors(key)):
-                output_nncf_nodes.append(self._nx_node_to_nncf_node(self._nx_graph.nodes[key]))
-            if not list(self._nx_graph.predecessors(key)):
-                input_nncf_nodes.append(self._nx_node_to_nncf_node(self._nx_graph.nodes[key]))
+            node = self._nx_node_to_nncf_node(self._nx_graph.nodes[key])
+            if not self._get_next_node_ids(node):
+                output_nncf_nodes.append(node)
+            if not self._get_previous_node_ids(node):
+                input_nncf_nodes.append(node)
 
         for nx_edge in boundary:
             from_node_key = nx_edge[0]
@@ -676,9 +692,9 @@ class NNCFGraph:
             nncf_edge = NNCFGraphEdge(self._nx_node_to_nncf_node(self._nx_graph.nodes[from_node_key]),
                                       self._nx_node_to_nncf_node(self._nx_graph.nodes[to_node_key]),
                                       data[NNCFGraph.ACTIVATION_SHAPE_EDGE_ATTR])
-            if from_node_key in match:
+            if from_node_key in match_set:
                 output_nncf_edges.append(nncf_edge)
-            elif to_node_key in match:
+            elif to_node_key in match_set:
                 input_nncf_edges.append(nncf_edge)
             else:
                 raise RuntimeError("Invalid graph expression supplied!")
@@ -686,10 +702,21 @@ class NNCFGraph:
         return NNCFGraphPatternIO(input_nncf_edges, output_nncf_edges,
                                   input_nncf_nodes, output_nncf_nodes)
 
-    @staticmethod
-    def _nx_node_to_nncf_node(nx_node) -> 'NNCFNode':
-        return NNCFNode(nx_node[NNCFGraph.ID_NODE_ATTR],
-                        nx_node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR])
+    def _nx_node_to_nncf_node(self, nx_node) -> 'NNCFNode':
+        # Nodes are never removed from the graph, so a wrapper created once (normally at node
+        # addition time) stays valid and is shared between all the subsequent queries.
+        node_id = nx_node[NNCFGraph.ID_NODE_ATTR]
+        node = self._node_cache.get(node_id)
+        if node is None:
+            node = NNCFNode(node_id, nx_node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR])
+            self._node_cache[node_id] = node
+        return node
+
+    def _get_node_by_id(self, node_id: int) -> NNCFNode:
+        node = self._node_cache.get(node_id)
+        if node is None:
+            node = self._nx_node_to_nncf_node(self._nx_graph.nodes[self._node_id_to_key_dict[node_id]])
+        return node
 
     def find_node_in_nx_graph_by_scope(self, scope: 'Scope') -> Optional[dict]:
         """
@@ -698,10 +725,10 @@ class NNCFGraph:
         :param scope: Scope to find in graph
         :return: node from networkx graph for graph (or None if such scope is not found)
         """
-        nodes = self._nx_graph.nodes
-        for node_key in nodes:
-            if nodes[node_key][NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR].scope_in_model == scope:
-                return nodes[node_key]
+        op_exec_context_attr = NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR
+        for node in self._nx_graph.nodes.values():
+            if node[op_exec_context_attr].scope_in_model == scope:
+                return node
         return None
 
     def visualize_graph(self, path):
@@ -723,8 +750,9 @@ class NNCFGraph:
 
     def get_op_nodes_in_scope(self, scope: 'Scope') -> List:
         matching_graph_op_nodes = []
-        for _, node in self._nx_graph.nodes.items():
-            op_scope = node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR].input_agnostic.scope_in_model
+        op_exec_context_attr = NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR
+        for node in self._nx_graph.nodes.values():
+            op_scope = node[op_exec_context_attr].input_agnostic.scope_in_model
             if op_scope in scope:
                 matching_graph_op_nodes.append(node)
         return matching_graph_op_nodes
@@ -732,3 +760,6 @@ class NNCFGraph:
 class NNCFNodeExpression(NodeExpression):
     def __init__(self, node_type: str = None, filter_fn=None):
         super().__init__(node_type, filter_fn, node_type_fn=NNCFGraph.node_type_fn)
+
+    def get_first_node_types(self) -> Optional[Set[str]]:
+        return {self.node_type}
@@ -12,7 +12,7 @@
 """
 
 from itertools import chain, combinations
-from typing import Callable, List
+from typing import Callable, List, Optional, Set
 
 import numpy as np
 import networkx as nx
@@ -44,6 +44,12 @@ class Expression:
     def _iterate_alternatives(self, nodes):
         return powerset(nodes, min_r=1)
 
+    def get_first_node_types(self) -> Optional[Set[str]]:
+        """Returns the set of NNCFGraph operator names that the first node of any match of this expression
+        must have, or None if the first node may have any type or if the expression determines the node
+        types in a different manner."""
+        return None
+
     def match(self, nodes, graph):
         all_matches = []
         for n in self._iterate_alternatives(nodes):
@@ -80,6 +86,9 @@ class ConcatExpression(Expression):
             nodes = following
         return full_match, following
 
+    def get_first_node_types(self) -> Optional[Set[str]]:
+        return self.expressions[0].get_first_node_types()
+
     def __add__(self, other):
         return ConcatExpression(self.expressions + [other])
 
@@ -109,6 +118,15 @@ class AlternatingExpression(Expression):
             return max(all_matches, key=lambda x: len(x[0]))
         return None
 
+    def get_first_node_types(self) -> Optional[Set[str]]:
+        first_node_types = set()
+        for ex in self.expressions:
+            ex_first_node_types = ex.get_first_node_types()
+            if ex_first_node_types is None:
+                return None
+            first_node_types.update(ex_first_node_types)
+        return first_node_types
+
     def __or__(self, other):
         return AlternatingExpression(self.expressions + [other])
 
@@ -209,24 +227,33 @@ class NodeExpression(Expression):
 
 
 def get_edge_boundaries(match: List[str], graph: nx.DiGraph):
-    out_edge_boundary = list(nx.edge_boundary(graph, match, data=True))
-    complement = list(filter(lambda x: x not in match, graph.nodes.keys()))
-    in_edge_boundary = list(nx.edge_boundary(graph, complement, data=True))
+    # Only the edges adjacent to the matched nodes are inspected, as opposed to using nx.edge_boundary
+    # for the complement of the match, which would go over the entire graph
+    match_set = set(match)
+    out_edge_boundary = [(from_key, to_key, data) for from_key in match
+                         for to_key, data in graph.succ[from_key].items() if to_key not in match_set]
+    in_edge_boundary = [(from_key, to_key, data) for to_key in match
+                        for from_key, data in graph.pred[to_key].items() if from_key not in match_set]
     return in_edge_boundary, out_edge_boundary
 
 
-def search_all(graph: nx.DiGraph, expression: Expression) -> List[List[str]]:
-    """Returns list of node key lists that match the expression."""
+def search_all(graph: nx.DiGraph, expression: Expression, first_node_candidates: Optional[Set[str]] = None) \
+        -> List[List[str]]:
+    """Returns list of node key lists that match the expression. If first_node_candidates is specified,
+    only the matches starting from the nodes in this set will be searched for - e.g. the nodes having
+    one of the types from expression.get_first_node_types()."""
     matches = []
     matched_nodes = set()
     weakly_subgraphs = [graph.subgraph(c) for c in nx.weakly_connected_components(graph)]
     for subgraph in weakly_subgraphs:
         dfs_order = nx.topological_sort(subgraph)
         for node in dfs_order:
-            match, _ = expression.match([node], graph)
-
             if node in matched_nodes:
                 continue
+            if first_node_candidates is not None and node not in first_node_candidates:
+                continue
+
+            match, _ = expression.match([node], graph)
 
             if match:
                 for mn in match:
@@ -11,83 +11,177 @@
  limitations under the License.
 """
 from collections import Counter
+from typing import List, Tuple
 
-from nncf.dynamic_graph.graph import NNCFGraph, NNCFGraphPatternIO, NNCFGraphEdge, NNCFNode
+import pytest
+
+from nncf.dynamic_graph.context import Scope
+from nncf.dynamic_graph.graph import NNCFGraph, NNCFGraphPatternIO, NNCFGraphEdge, NNCFNode, \
+    InputAgnosticOperationExecutionContext, NNCFNodeExpression, OperationExecutionContext
+from nncf.dynamic_graph.graph_matching import NodeExpression
+from nncf.dynamic_graph.trace_tensor import TensorMeta
 
 
 def test_graph_pattern_io_building():
-    graph = NNCFGraph()
-    #   1
+    #   0
     # /   \
-    # 2   |
+    # 1   |
     # |   |
-    # 3   |
+    # 2   |
     # \   /
-    #   4
+    #   3
     # / | \
-    # 5 6 7
+    # 4 5 6
     # |
-    # 8
-
-    #pylint:disable=protected-access
-    node_keys = ['1', '2', '3', '4', '5', '6', '7', '8']
-    for idx, node_key in enumerate(node_keys):
-        attrs = {
-            NNCFGraph.ID_NODE_ATTR: idx + 1,
-            NNCFGraph.KEY_NODE_ATTR: node_key,
-            NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR: None,
-        }
-        graph._nx_graph.add_node(node_key, **attrs)
-
-    edge_attr = {NNCFGraph.ACTIVATION_SHAPE_EDGE_ATTR: None}
-    graph._nx_graph.add_edges_from([('1', '2'), ('1', '4'), ('2', '3'), ('3', '4'), ('4', '5'),
-                                    ('4', '6'), ('4', '7'), ('5', '8')], **edge_attr)
-    graph._node_id_to_key_dict.update({k + 1: v for k, v in enumerate(node_keys)})
+    # 7
+    graph = make_traced_graph([('nncf_model_input', []),
+                               ('conv2d', [0]),
+                               ('conv2d', [1]),
+                               ('__add__', [2, 0]),
+                               ('RELU', [3]),
+                               ('RELU', [3]),
+                               ('RELU', [3]),
+                               ('conv2d', [4])])
 
     def make_mock_edge(from_id: int, to_id: int):
         return NNCFGraphEdge(NNCFNode(from_id, None),
-                             NNCFNode(to_id, None), None)
+                             NNCFNode(to_id, None), [1, 1])
 
     def make_mock_node(id_: int):
         return NNCFNode(id_, None)
 
     ref_patterns_and_ios = [
-        (['1', '2'], NNCFGraphPatternIO(input_edges=[],
-                                        input_nodes=[make_mock_node(1)],
-                                        output_edges=[make_mock_edge(2, 3),
-                                                      make_mock_edge(1, 4)],
-                                        output_nodes=[])),
-        (['3'], NNCFGraphPatternIO(input_edges=[make_mock_edge(2, 3)],
-                                   input_nodes=[],
-                                   output_edges=[make_mock_edge(3, 4)],
-                                   output_nodes=[])),
-        (['1', '2', '3'], NNCFGraphPatternIO(input_edges=[],
-                                             input_nodes=[make_mock_node(1)],
-                                             output_edges=[make_mock_edge(3, 4),
-                                                           make_mock_edge(1, 4)],
-                                             output_nodes=[])),
-        (['4'], NNCFGraphPatternIO(input_edges=[make_mock_edge(3, 4),
-                                                make_mock_edge(1, 4)],
-                                   input_nodes=[],
-                                   output_edges=[make_mock_edge(4, 5),
-                                                 make_mock_edge(4, 6),
-                                                 make_mock_edge(4, 7)],
-                                   output_nodes=[])),
-        (['5', '6', '8'], NNCFGraphPatternIO(input_edges=[make_mock_edge(4, 5),
-                                                          make_mock_edge(4, 6)],
-                                             input_nodes=[],
-                                             output_edges=[],
-                                             output_nodes=[make_mock_node(6),
-                                                           make_mock_node(8)])),
-        (['7'], NNCFGraphPatternIO(input_edges=[make_mock_edge(4, 7)],
-                                   input_nodes=[],
-                                   output_edges=[],
-                                   output_nodes=[make_mock_node(7)]))
+        ([0, 1], NNCFGraphPatternIO(input_edges=[],
+                                    input_nodes=[make_mock_node(0)],
+                                    output_edges=[make_mock_edge(1, 2),
+                                                  make_mock_edge(0, 3)],
+                                    output_nodes=[])),
+        ([2], NNCFGraphPatternIO(input_edges=[make_mock_edge(1, 2)],
+                                 input_nodes=[],
+                                 output_edges=[make_mock_edge(2, 3)],
+                                 output_nodes=[])),
+        ([0, 1, 2], NNCFGraphPatternIO(input_edges=[],
+                                       input_nodes=[make_mock_node(0)],
+                                       output_edges=[make_mock_edge(2, 3),
+                                                     make_mock_edge(0, 3)],
+                                       output_nodes=[])),
+        ([3], NNCFGraphPatternIO(input_edges=[make_mock_edge(2, 3),
+                                              make_mock_edge(0, 3)],
+                                 input_nodes=[],
+                                 output_edges=[make_mock_edge(3, 4),
+                                               make_mock_edge(3, 5),
+                                               make_mock_edge(3, 6)],
+                                 output_nodes=[])),
+        ([4, 5, 7], NNCFGraphPatternIO(input_edges=[make_mock_edge(3, 4),
+                                                    make_mock_edge(3, 5)],
+                                       input_nodes=[],
+                                       output_edges=[],
+                                       output_nodes=[make_mock_node(5),
+                                                     make_mock_node(7)])),
+        ([6], NNCFGraphPatternIO(input_edges=[make_mock_edge(3, 6)],
+                                 input_nodes=[],
+                                 output_edges=[],
+                                 output_nodes=[make_mock_node(6)]))
     ]
 
+    #pylint:disable=protected-access
     for pattern, ref_pattern_io in ref_patterns_and_ios:
-        test_pattern_io = graph._get_nncf_graph_pattern_io_list(pattern)
+        test_pattern_io = graph._get_nncf_graph_pattern_io_list([graph.get_node_key_by_id(node_id)
+                                                                  for node_id in pattern])
         assert Counter(test_pattern_io.input_edges) == Counter(ref_pattern_io.input_edges)
         assert Counter(test_pattern_io.output_edges) == Counter(ref_pattern_io.output_edges)
         assert Counter(test_pattern_io.input_nodes) == Counter(ref_pattern_io.input_nodes)
         assert Counter(test_pattern_io.output_nodes) == Counter(ref_pattern_io.output_nodes)
+
+
+def make_traced_graph(node_types_and_inputs: List[Tuple[str, List[int]]]) -> NNCFGraph:
+    """Builds the graph via the regular node addition process - the (i)-th node in the graph
+    will have the (i)-th type from the list and will have incoming edges from the nodes with the
+    listed IDs."""
+    graph = NNCFGraph()
+    call_counters = Counter()
+    for node_type, input_node_ids in node_types_and_inputs:
+        ia_op_exec_context = InputAgnosticOperationExecutionContext(node_type, Scope(), call_counters[node_type])
+        call_counters[node_type] += 1
+        tensor_metas = [TensorMeta(creator_id, 0, [1, 1]) for creator_id in input_node_ids]
+        graph.add_node(ia_op_exec_context, tensor_metas, [], [])
+    return graph
+
+
+def test_traverse_graph_visits_each_node_once():
+    #   0
+    #  / \
+    # 1   2
+    #  \ /
+    #   3
+    #   |
+    #   4
+    graph = make_traced_graph([('nncf_model_input', []),
+                               ('conv2d', [0]),
+                               ('RELU', [0]),
+                               ('__add__', [1, 2]),
+                               ('RELU', [3])])
+
+    def collect_all(node: NNCFNode, output: List[int]) -> Tuple[bool, List[int]]:
+        output.append(node.node_id)
+        return False, output
+
+    def stop_at_conv(node: NNCFNode, output: List[int]) -> Tuple[bool, List[int]]:
+        output.append(node.node_id)
+        return node.op_exec_context.operator_name == 'conv2d', output
+
+    input_node = graph.get_input_nodes()[0]
+    output_node = graph.get_graph_outputs()[0]
+    assert graph.traverse_graph(input_node, collect_all) == [0, 1, 3, 4, 2]
+    assert graph.traverse_graph(input_node, stop_at_conv) == [0, 1, 2, 3, 4]
+    assert graph.traverse_graph(output_node, collect_all, traverse_forward=False) == [4, 3, 1, 0, 2]
+
+
+def test_get_node_id_by_iap_context():
+    graph = make_traced_graph([('nncf_model_input', []),
+                               ('conv2d', [0]),
+                               ('conv2d', [1])])
+    second_conv_context = InputAgnosticOperationExecutionContext('conv2d', Scope(), 1)
+    assert graph.get_node_id_by_iap_context(second_conv_context) == graph.get_node_key_by_id(2)
+    with pytest.raises(AttributeError):
+        graph.get_node_id_by_iap_context(InputAgnosticOperationExecutionContext('conv2d', Scope(), 2))
+
+
+def test_get_matching_pattern_io_list_with_custom_node_type_fn():
+    graph = make_traced_graph([('nncf_model_input', []),
+                               ('conv2d', [0]),
+                               ('RELU', [1]),
+                               ('conv2d', [2]),
+                               ('RELU', [3])])
+
+    def node_type_with_call_order(node: dict) -> str:
+        ia_op_exec_context = node[NNCFGraph.OP_EXEC_CONTEXT_NODE_ATTR].input_agnostic
+        return '{}_{}'.format(ia_op_exec_context.operator_name, ia_op_exec_context.call_order)
+
+    assert len(graph.get_matching_nncf_graph_pattern_io_list(NNCFNodeExpression('conv2d'))) == 2
+    pattern = NodeExpression('conv2d_1', node_type_fn=node_type_with_call_order) + \
+              NodeExpression('RELU_1', node_type_fn=node_type_with_call_order)
+    pattern_ios = graph.get_matching_nncf_graph_pattern_io_list(pattern)
+    assert len(pattern_ios) == 1
+    assert [edge.from_node.node_id for edge in pattern_ios[0].input_edges] == [2]
+
+
+def test_nncf_node_equality_is_determined_by_node_id():
+    conv_node = NNCFNode(1, OperationExecutionContext('conv2d', Scope(), 0, []))
+    relu_node_with_same_id = NNCFNode(1, OperationExecutionContext('RELU', Scope(), 0, []))
+    assert conv_node == relu_node_with_same_id
+    assert hash(conv_node) == hash(relu_node_with_same_id)
+    assert conv_node != NNCFNode(2, conv_node.op_exec_context)
+    assert conv_node != 1
+    assert conv_node.__eq__(1) is NotImplemented
+
+
+def test_nncf_graph_edge_stores_tensor_shape_as_tuple():
+    from_node = NNCFNode(0, None)
+    to_node = NNCFNode(1, None)
+    edge = NNCFGraphEdge(from_node, to_node, [1, 2])
+    assert edge.tensor_shape == (1, 2)
+    assert edge == NNCFGraphEdge(from_node, to_node, (1, 2))
+    assert hash(edge) == hash(NNCFGraphEdge(from_node, to_node, (1, 2)))
+    assert hash(edge) != hash(NNCFGraphEdge(from_node, to_node, [1, 3]))
+    assert NNCFGraphEdge(from_node, to_node, None).tensor_shape is None
@@ -13,6 +13,7 @@
 
 import networkx as nx
 
+from nncf.dynamic_graph.graph import NNCFNodeExpression
 from nncf.dynamic_graph.graph_matching import NodeExpression as N, search_all
 
 
@@ -147,3 +148,27 @@ def test_branching_expression2():
 
     matches = search_all(g, ex)
     assert matches == [[1, 2, 3, 5, 4]]
+
+
+def test_first_node_types():
+    NN = NNCFNodeExpression
+    assert (NN('a') + NN('b')).get_first_node_types() == {'a'}
+    assert ((NN('a') | NN('b')) + NN('c') | NN('d') + NN('e')).get_first_node_types() == {'a', 'b', 'd'}
+    assert (NN('a') & NN('b')).get_first_node_types() is None
+    assert ((NN('a') & NN('b')) + NN('c') | NN('d')).get_first_node_types() is None
+
+    # Generic node expressions may define the node types in an arbitrary way
+    assert N('a').get_first_node_types() is None
+    assert (NN('a') | N('b')).get_first_node_types() is None
+
+
+def test_first_node_candidates():
+    g = nx.DiGraph()
+    add_nodes(g, ['a', 'b', 'c', 'a', 'b', 'c'])
+    g.add_edges_from([(1, 2), (2, 3), (3, 4), (4, 5), (5, 6)])
+
+    ex = N('b') + N('c')
+
+    assert search_all(g, ex, first_node_candidates={2, 5}) == [[2, 3], [5, 6]]
+    assert search_all(g, ex, first_node_candidates={5}) == [[5, 6]]
+    assert not search_all(g, ex, first_node_candidates=set())